@@ -2,33 +2,159 @@
 """
 Audio Processing: Extract audio from video and transcribe using OpenAI Whisper
 Cost-effective solution: $0.006/minute
+Set WHISPER_BACKEND=local to transcribe with faster-whisper instead (free, GPU recommended)
 """
 
 import sys
 import json
+import asyncio
 import os
-import subprocess
+import random
+import shutil
 import tempfile
 import logging
-from pathlib import Path
-from openai import OpenAI
+import httpx
 import yt_dlp
 import re
+from dataclasses import asdict, dataclass
+
+# orjson is optional, fall back to stdlib json when it isn't installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Formats accepted by the Whisper API
+SUPPORTED_AUDIO_EXTENSIONS = ('.flac', '.m4a', '.mp3', '.mp4', '.mpeg', '.mpga', '.oga', '.ogg', '.wav', '.webm')
+
+# Max concurrent Whisper requests
+MAX_CONCURRENT_TRANSCRIPTIONS = 8
+
+# Whisper endpoint, honours OPENAI_BASE_URL like the OpenAI SDK does
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL") or "https://api.openai.com/v1"
+
+# Retries for rate limits (429), server errors (5xx) and dropped connections,
+# with exponential backoff unless the API sends Retry-After
+WHISPER_MAX_RETRIES = 3
+WHISPER_RETRY_BASE_DELAY = 1.0
+WHISPER_RETRY_MAX_DELAY = 30.0
+
+# Transcription backend: "openai" (Whisper API) or "local" (faster-whisper)
+WHISPER_BACKEND = os.environ.get("WHISPER_BACKEND", "openai").lower()
+LOCAL_WHISPER_MODEL = os.environ.get("WHISPER_LOCAL_MODEL", "large-v3")
+LOCAL_WHISPER_BATCH_SIZE = 16
+
+# faster-whisper reports ISO codes, the API's verbose_json reports these names
+# (same table as openai-whisper's tokenizer.LANGUAGES)
+WHISPER_LANGUAGE_NAMES = {
+    "en": "english", "zh": "chinese", "de": "german", "es": "spanish", "ru": "russian",
+    "ko": "korean", "fr": "french", "ja": "japanese", "pt": "portuguese", "tr": "turkish",
+    "pl": "polish", "ca": "catalan", "nl": "dutch", "ar": "arabic", "sv": "swedish",
+    "it": "italian", "id": "indonesian", "hi": "hindi", "fi": "finnish", "vi": "vietnamese",
+    "he": "hebrew", "uk": "ukrainian", "el": "greek", "ms": "malay", "cs": "czech",
+    "ro": "romanian", "da": "danish", "hu": "hungarian", "ta": "tamil", "no": "norwegian",
+    "th": "thai", "ur": "urdu", "hr": "croatian", "bg": "bulgarian", "lt": "lithuanian",
+    "la": "latin", "mi": "maori", "ml": "malayalam", "cy": "welsh", "sk": "slovak",
+    "te": "telugu", "fa": "persian", "lv": "latvian", "bn": "bengali", "sr": "serbian",
+    "az": "azerbaijani", "sl": "slovenian", "kn": "kannada", "et": "estonian", "mk": "macedonian",
+    "br": "breton", "eu": "basque", "is": "icelandic", "hy": "armenian", "ne": "nepali",
+    "mn": "mongolian", "bs": "bosnian", "kk": "kazakh", "sq": "albanian", "sw": "swahili",
+    "gl": "galician", "mr": "marathi", "pa": "punjabi", "si": "sinhala", "km": "khmer",
+    "sn": "shona", "yo": "yoruba", "so": "somali", "af": "afrikaans", "oc": "occitan",
+    "ka": "georgian", "be": "belarusian", "tg": "tajik", "sd": "sindhi", "gu": "gujarati",
+    "am": "amharic", "yi": "yiddish", "lo": "lao", "uz": "uzbek", "fo": "faroese",
+    "ht": "haitian creole", "ps": "pashto", "tk": "turkmen", "nn": "nynorsk", "mt": "maltese",
+    "sa": "sanskrit", "lb": "luxembourgish", "my": "myanmar", "bo": "tibetan", "tl": "tagalog",
+    "mg": "malagasy", "as": "assamese", "tt": "tatar", "haw": "hawaiian", "ln": "lingala",
+    "ha": "hausa", "ba": "bashkir", "jw": "javanese", "su": "sundanese", "yue": "cantonese",
+}
+
+# Whisper resamples to 16kHz mono internally, so don't upload more than that
+WHISPER_AUDIO_ARGS = ['-ac', '1', '-ar', '16000']
+
+# Whisper rejects uploads over 25MB, longer audio is split into chunks below this size
+WHISPER_MAX_FILE_SIZE = 25 * 1024 * 1024
+CHUNK_MAX_FILE_SIZE = 24 * 1024 * 1024
+
+# Common YouTube URL forms, checked before falling back to YOUTUBE_URL_RE
+YOUTUBE_URL_PREFIXES = (
+    'https://www.youtube.com/watch?v=', 'https://youtube.com/watch?v=', 'https://m.youtube.com/watch?v=',
+    'https://www.youtube.com/embed/', 'https://youtu.be/', 'http://www.youtube.com/watch?v=', 'http://youtu.be/',
+)
+YOUTUBE_URL_RE = re.compile(r'(https?://)?(www\.)?(youtube\.com/(watch\?v=|embed/|v/)|youtu\.be/)')
+SILENCE_START_RE = re.compile(r'silence_start: (-?[\d.]+)')
+SILENCE_END_RE = re.compile(r'silence_end: (-?[\d.]+)')
+DURATION_RE = re.compile(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)')
+
+@dataclass(slots=True)
+class TranscriptResult:
+    """Result of transcribing one video"""
+    success: bool
+    transcript: str
+    language: str
+    duration: float | None = None
+    message: str = ''
+    estimated_cost: float | None = None
+
 class AudioProcessor:
-    def __init__(self):
-        self.openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+    def __init__(self, detect_language=True):
+        # Only verbose_json reports the language, plain json is smaller and cheaper
+        # to produce; duration then comes from ffprobe
+        self.response_format = "verbose_json" if detect_language else "json"
+        
+        # Plain httpx client so uploads stream from disk instead of being buffered
+        self.api_key = os.environ.get("OPENAI_API_KEY")
+        self.http_client = httpx.AsyncClient(base_url=OPENAI_BASE_URL, timeout=120)
+        self.transcription_semaphore = asyncio.Semaphore(MAX_CONCURRENT_TRANSCRIPTIONS)
+        
+        self.backend = WHISPER_BACKEND
+        # Local model is loaded on first use and runs one file at a time
+        self.local_pipeline = None
+        self.local_lock = asyncio.Lock()
+        
+    async def close(self):
+        """Close the HTTP client used for Whisper requests"""
+        await self.http_client.aclose()
+        
+    async def run_command(self, cmd, timeout=60):
+        """
+        Run an external command (FFmpeg) without blocking the event loop
+        
+        Args:
+            cmd (list): Command and arguments
+            timeout (int): Seconds before the process is killed
+            
+        Returns:
+            tuple: (return code, stdout, stderr) with output decoded to str
+        """
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            # Don't leave FFmpeg running (and writing files) after a timeout or cancel
+            proc.kill()
+            await proc.wait()
+            raise
+        return proc.returncode, stdout.decode(errors='replace'), stderr.decode(errors='replace')
         
     def is_youtube_url(self, url):
         """Check if URL is a YouTube URL"""
-        youtube_pattern = r'(https?://)?(www\.)?(youtube\.com/(watch\?v=|embed/|v/)|youtu\.be/)'
-        return bool(re.search(youtube_pattern, url))
+        if url.startswith(YOUTUBE_URL_PREFIXES):
+            return True
+        # Every form the regex accepts contains "youtu", skip it for anything else
+        if 'youtu' not in url:
+            return False
+        return YOUTUBE_URL_RE.search(url) is not None
         
-    def download_youtube_audio(self, youtube_url, output_path=None):
+    async def download_youtube_audio(self, youtube_url, output_path=None):
         """
         Download audio from YouTube using yt-dlp
         
@@ -41,37 +167,100 @@ class AudioProcessor:
         """
         try:
             if output_path is None:
-                # Create temporary file for audio
-                temp_audio = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False)
-                output_path = temp_audio.name
-                temp_audio.close()
+                # Reserve a temporary name, yt-dlp appends the real extension
+                fd, output_path = tempfile.mkstemp()
+                os.close(fd)
             
             logger.info(f"🎵 Downloading audio from YouTube: {youtube_url}")
             
             # yt-dlp options for extracting audio
+            # The stream is downloaded as-is and re-encoded by encode_for_whisper,
+            # yt-dlp's own postprocessor would stream-copy opus sources untouched
+            base_path = os.path.splitext(output_path)[0]
             ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': output_path.replace('.mp3', '.%(ext)s'),
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
+                'format': 'bestaudio[ext=m4a]/bestaudio',
+                'outtmpl': base_path + '.%(ext)s',
                 'quiet': True,
                 'no_warnings': True,
+                # Fetch fragmented (DASH/HLS) streams in parallel
+                'concurrent_fragment_downloads': 8,
             }
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([youtube_url])
+            # aria2c opens several connections per file, use it when installed
+            if shutil.which('aria2c'):
+                ydl_opts['external_downloader'] = {'default': 'aria2c'}
+                ydl_opts['external_downloader_args'] = {'aria2c': ['-x', '16', '-k', '1M']}
             
-            logger.info(f"✅ YouTube audio downloaded to: {output_path}")
-            return output_path
+            def _download():
+                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                    return ydl.extract_info(youtube_url, download=True)
+            
+            # yt-dlp is blocking, keep it off the event loop
+            loop = asyncio.get_running_loop()
+            info = await loop.run_in_executor(None, _download)
+            
+            # Real path depends on the container yt-dlp picked
+            downloads = info.get('requested_downloads') or []
+            if not downloads or not downloads[0].get('filepath'):
+                raise Exception("yt-dlp did not report a downloaded file")
+            downloaded_path = downloads[0]['filepath']
+            if downloaded_path != output_path:
+                # Drop the empty placeholder created for the temp name
+                try:
+                    if os.stat(output_path).st_size == 0:
+                        os.unlink(output_path)
+                except FileNotFoundError:
+                    pass
+            
+            # Always re-encode to 16kHz mono Opus in an .ogg container Whisper accepts
+            audio_path = base_path + '.ogg'
+            if audio_path == downloaded_path:
+                audio_path = base_path + '.whisper.ogg'
+            try:
+                await self.encode_for_whisper(downloaded_path, audio_path, timeout=300)
+            except BaseException:
+                self.remove_files([audio_path])
+                raise
+            finally:
+                self.remove_files([downloaded_path])
+            
+            logger.info(f"✅ YouTube audio downloaded to: {audio_path}")
+            return audio_path
             
         except Exception as e:
             logger.error(f"❌ YouTube download error: {e}")
             raise Exception(f"YouTube download failed: {e}")
         
-    def extract_audio_from_video(self, video_url, output_path=None):
+    async def encode_for_whisper(self, input_path, output_path, timeout=60):
+        """
+        Encode audio to 16kHz mono low-bitrate Ogg/Opus with FFmpeg
+        
+        Args:
+            input_path (str): URL or path to video/audio file
+            output_path (str): Output path, must end in .ogg
+            timeout (int): Seconds before FFmpeg is killed
+        """
+        # FFmpeg command to extract audio
+        cmd = [
+            'ffmpeg', '-i', input_path,
+            '-vn',  # Drop video stream
+            *WHISPER_AUDIO_ARGS,  # 16kHz mono
+            '-c:a', 'libopus',  # Low-bitrate Opus instead of MP3
+            '-b:a', '16k',
+            '-application', 'voip',  # Tuned for speech
+            '-threads', '0',
+            '-y',  # Overwrite output
+            output_path
+        ]
+        
+        # Run FFmpeg without blocking the event loop
+        returncode, _, stderr = await self.run_command(cmd, timeout=timeout)
+        
+        if returncode != 0:
+            logger.error(f"❌ FFmpeg error: {stderr}")
+            raise Exception(f"FFmpeg failed: {stderr}")
+        
+    async def extract_audio_from_video(self, video_url, output_path=None):
         """
         Extract audio from video using appropriate method
         - YouTube URLs: yt-dlp
@@ -87,98 +276,332 @@ class AudioProcessor:
         try:
             # Check if it's a YouTube URL
             if self.is_youtube_url(video_url):
-                return self.download_youtube_audio(video_url, output_path)
+                return await self.download_youtube_audio(video_url, output_path)
             
             # For direct video files, use FFmpeg
             if output_path is None:
                 # Create temporary file for audio
-                temp_audio = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False)
-                output_path = temp_audio.name
-                temp_audio.close()
+                fd, output_path = tempfile.mkstemp(suffix='.ogg')
+                os.close(fd)
             
             logger.info(f"🎵 Extracting audio from: {video_url}")
             
-            # FFmpeg command to extract audio
-            cmd = [
-                'ffmpeg', '-i', video_url,
-                '-q:a', '2',  # High quality
-                '-map', 'a',  # Audio stream only
-                '-y',  # Overwrite output
-                output_path
-            ]
-            
-            # Run FFmpeg
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-            
-            if result.returncode != 0:
-                logger.error(f"❌ FFmpeg error: {result.stderr}")
-                raise Exception(f"FFmpeg failed: {result.stderr}")
+            # Whisper accepts Ogg/Opus directly, so skip the MP3 encode
+            output_path = os.path.splitext(output_path)[0] + '.ogg'
+            await self.encode_for_whisper(video_url, output_path, timeout=60)
             
             logger.info(f"✅ Audio extracted to: {output_path}")
             return output_path
             
-        except subprocess.TimeoutExpired:
+        except asyncio.TimeoutError:
             logger.error("❌ Audio extraction timeout - video too long or slow network")
             raise Exception("Audio extraction timeout")
         except Exception as e:
             logger.error(f"❌ Audio extraction error: {e}")
             raise
 
-    def transcribe_audio(self, audio_path):
+    async def split_audio(self, audio_path, max_bytes=CHUNK_MAX_FILE_SIZE, file_size=None):
+        """
+        Split audio into chunks under max_bytes, cutting at silence where possible
+        
+        Args:
+            audio_path (str): Path to audio file
+            max_bytes (int): Maximum size of each chunk
+            file_size (int): Size of audio_path if the caller already has it
+            
+        Returns:
+            list: Paths to chunk files in playback order
+        """
+        if file_size is None:
+            file_size = os.stat(audio_path).st_size
+        
+        # Locate silences (and total duration) in a single decode pass
+        cmd = [
+            'ffmpeg', '-i', audio_path,
+            '-af', 'silencedetect=n=-30dB:d=0.5',
+            '-f', 'null', '-'
+        ]
+        returncode, _, stderr = await self.run_command(cmd, timeout=600)
+        if returncode != 0:
+            raise Exception(f"FFmpeg silence detection failed: {stderr}")
+        
+        duration_match = DURATION_RE.search(stderr)
+        if not duration_match:
+            raise Exception("Could not determine audio duration")
+        hours, minutes, seconds = duration_match.groups()
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+        
+        # Cut in the middle of each silence
+        silence_starts = [float(t) for t in SILENCE_START_RE.findall(stderr)]
+        silence_ends = [float(t) for t in SILENCE_END_RE.findall(stderr)]
+        silences = [(start + end) / 2 for start, end in zip(silence_starts, silence_ends)]
+        
+        # Bitrate is roughly constant, so size scales with duration (keep 5% margin)
+        chunk_seconds = duration * max_bytes / file_size * 0.95
+        
+        cuts = [0.0]
+        while duration - cuts[-1] > chunk_seconds:
+            start = cuts[-1]
+            limit = start + chunk_seconds
+            # Prefer the last silence in the second half of the window
+            candidates = [t for t in silences if start + chunk_seconds / 2 < t <= limit]
+            cuts.append(candidates[-1] if candidates else limit)
+        cuts.append(duration)
+        
+        base, extension = os.path.splitext(audio_path)
+        chunk_paths = [f"{base}.part{i:03d}{extension}" for i in range(len(cuts) - 1)]
+        
+        async def cut_chunk(start, end, chunk_path):
+            cmd = [
+                'ffmpeg', '-i', audio_path,
+                '-ss', f"{start:.3f}", '-to', f"{end:.3f}",
+                '-c', 'copy',  # No re-encode
+                '-y', chunk_path
+            ]
+            returncode, _, stderr = await self.run_command(cmd, timeout=120)
+            if returncode != 0:
+                raise Exception(f"FFmpeg split failed: {stderr}")
+        
+        try:
+            # TaskGroup cancels and awaits the other cuts before files are removed
+            async with asyncio.TaskGroup() as tg:
+                for start, end, chunk_path in zip(cuts, cuts[1:], chunk_paths):
+                    tg.create_task(cut_chunk(start, end, chunk_path))
+        except ExceptionGroup as eg:
+            self.remove_files(chunk_paths)
+            raise eg.exceptions[0]
+        
+        logger.info(f"✂️ Split {audio_path} into {len(chunk_paths)} chunks")
+        return chunk_paths
+
+    async def probe_duration(self, audio_path):
+        """
+        Get audio duration in seconds with ffprobe
+        
+        Args:
+            audio_path (str): Path to audio file
+            
+        Returns:
+            float: Duration, or None if ffprobe can't tell
+        """
+        cmd = [
+            'ffprobe', '-v', 'error',
+            '-show_entries', 'format=duration',
+            '-of', 'default=nw=1:nk=1',
+            audio_path
+        ]
+        try:
+            returncode, stdout, _ = await self.run_command(cmd, timeout=30)
+            return float(stdout.strip()) if returncode == 0 else None
+        except (ValueError, OSError, asyncio.TimeoutError) as e:
+            logger.warning(f"⚠️ ffprobe failed: {e}")
+            return None
+
+    def remove_files(self, paths):
+        """Remove temporary files, ignoring ones that are already gone"""
+        for path in paths:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"⚠️ Cleanup warning: {e}")
+
+    async def request_transcription(self, audio_path):
+        """
+        Send a single file (under the 25MB limit) to Whisper
+        
+        Args:
+            audio_path (str): Path to audio file
+            
+        Returns:
+            dict: Whisper json/verbose_json response
+        """
+        if not self.api_key:
+            raise Exception("OPENAI_API_KEY is not set")
+        
+        for attempt in range(WHISPER_MAX_RETRIES + 1):
+            retry_after = None
+            try:
+                # Transcribe with Whisper
+                async with self.transcription_semaphore:
+                    # httpx streams the multipart body from the open file in chunks
+                    with open(audio_path, "rb") as audio_file:
+                        # the newest OpenAI model is "gpt-5" which was released August 7, 2025.
+                        # do not change this unless explicitly requested by the user
+                        # But for transcription we still use whisper-1
+                        response = await self.http_client.post(
+                            "audio/transcriptions",
+                            headers={"Authorization": f"Bearer {self.api_key}"},
+                            files={"file": (os.path.basename(audio_path), audio_file)},
+                            data={
+                                "model": "whisper-1",
+                                "response_format": self.response_format
+                            }
+                        )
+                
+                if response.status_code == 200:
+                    return response.json()
+                error = Exception(f"Whisper API error {response.status_code}: {response.text}")
+                if response.status_code != 429 and response.status_code < 500:
+                    raise error
+                retry_after = self.parse_retry_after(response)
+            except httpx.TransportError as e:
+                error = Exception(f"Whisper API connection error: {e}")
+            
+            if attempt == WHISPER_MAX_RETRIES:
+                raise error
+            
+            # Sleep outside the semaphore so other uploads can proceed
+            if retry_after is None:
+                retry_after = min(WHISPER_RETRY_BASE_DELAY * 2 ** attempt, WHISPER_RETRY_MAX_DELAY)
+                retry_after *= random.uniform(0.75, 1.25)
+            logger.warning(f"⚠️ {error}, retrying in {retry_after:.1f}s ({attempt + 1}/{WHISPER_MAX_RETRIES})")
+            await asyncio.sleep(retry_after)
+
+    def parse_retry_after(self, response):
+        """Seconds to wait from Retry-After / retry-after-ms headers, None if absent"""
+        try:
+            if "retry-after-ms" in response.headers:
+                delay = float(response.headers["retry-after-ms"]) / 1000
+            elif "retry-after" in response.headers:
+                delay = float(response.headers["retry-after"])
+            else:
+                return None
+        except ValueError:
+            # HTTP-date form, fall back to exponential backoff
+            return None
+        return min(max(delay, 0), WHISPER_RETRY_MAX_DELAY)
+
+    def load_local_pipeline(self):
+        """Load the faster-whisper model (optional dependency) on first use"""
+        if self.local_pipeline is None:
+            import ctranslate2
+            from faster_whisper import WhisperModel, BatchedInferencePipeline
+            
+            # INT8 weights halve memory traffic, int8 GEMM kernels use VNNI on CPU
+            cuda = ctranslate2.get_cuda_device_count() > 0
+            device = 'cuda' if cuda else 'cpu'
+            compute_type = 'int8_float16' if cuda else 'int8'
+            
+            logger.info(f"🧠 Loading local Whisper model: {LOCAL_WHISPER_MODEL} ({device}, {compute_type})")
+            model = WhisperModel(
+                LOCAL_WHISPER_MODEL,
+                device=device,
+                compute_type=compute_type,
+                cpu_threads=os.cpu_count() or 0
+            )
+            self.local_pipeline = BatchedInferencePipeline(model=model)
+        return self.local_pipeline
+
+    async def transcribe_local(self, audio_path):
+        """
+        Transcribe a file with the local faster-whisper batched pipeline
+        
+        Args:
+            audio_path (str): Path to audio file
+            
+        Returns:
+            dict: Same fields as the Whisper verbose_json response
+        """
+        def _transcribe():
+            pipeline = self.load_local_pipeline()
+            segments, info = pipeline.transcribe(audio_path, batch_size=LOCAL_WHISPER_BATCH_SIZE)
+            # Segments are generated lazily, decoding happens while joining
+            text = "".join(segment.text for segment in segments)
+            language = WHISPER_LANGUAGE_NAMES.get(info.language, info.language)
+            return {"text": text, "language": language, "duration": info.duration}
+        
+        # Inference is blocking, run it off the event loop, one file at a time
+        async with self.local_lock:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, _transcribe)
+
+    async def transcribe_audio(self, audio_path):
         """
-        Transcribe audio using OpenAI Whisper API
+        Transcribe audio using OpenAI Whisper API (or local faster-whisper)
         
         Args:
             audio_path (str): Path to audio file
             
         Returns:
-            dict: Transcription result with text and language
+            TranscriptResult: Transcription result with text and language
         """
         try:
             logger.info(f"🎤 Transcribing audio: {audio_path}")
             
-            # Check file size (Whisper has 25MB limit)
-            file_size = os.path.getsize(audio_path)
-            if file_size > 25 * 1024 * 1024:  # 25MB
-                logger.warning(f"⚠️ File too large: {file_size/1024/1024:.1f}MB (max 25MB)")
-                return {
-                    "success": False,
-                    "transcript": "",
-                    "language": "en",
-                    "message": f"Файл слишком большой: {file_size/1024/1024:.1f}MB (максимум 25MB)"
-                }
-            
-            # Transcribe with Whisper
-            with open(audio_path, "rb") as audio_file:
-                # the newest OpenAI model is "gpt-5" which was released August 7, 2025.
-                # do not change this unless explicitly requested by the user
-                # But for transcription we still use whisper-1
-                transcript = self.openai_client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file,
-                    response_format="verbose_json"  # Get language info too
+            # Whisper detects the format from the file extension
+            extension = os.path.splitext(audio_path)[1].lower()
+            if extension not in SUPPORTED_AUDIO_EXTENSIONS:
+                logger.warning(f"⚠️ Unsupported audio format: {extension}")
+                return TranscriptResult(
+                    success=False,
+                    transcript="",
+                    language="en",
+                    message=f"Неподдерживаемый формат аудио: {extension}"
                 )
             
-            logger.info(f"✅ Transcription completed: {len(transcript.text)} characters")
+            # Whisper has 25MB limit, split larger files and transcribe chunks in parallel
+            # (checked before the file is ever opened)
+            file_size = os.stat(audio_path).st_size
+            if self.backend == "local":
+                # No upload limit for the local model
+                transcripts = [await self.transcribe_local(audio_path)]
+            elif file_size > WHISPER_MAX_FILE_SIZE:
+                logger.info(f"✂️ File too large for one request: {file_size/1024/1024:.1f}MB, splitting at silence")
+                chunk_paths = await self.split_audio(audio_path, file_size=file_size)
+                try:
+                    # On the first failure TaskGroup cancels and awaits the other
+                    # uploads, so no request still reads a chunk once it's removed
+                    async with asyncio.TaskGroup() as tg:
+                        tasks = [
+                            tg.create_task(self.request_transcription(chunk_path))
+                            for chunk_path in chunk_paths
+                        ]
+                except ExceptionGroup as eg:
+                    raise eg.exceptions[0]
+                finally:
+                    self.remove_files(chunk_paths)
+                transcripts = [task.result() for task in tasks]
+            else:
+                transcripts = [await self.request_transcription(audio_path)]
             
-            return {
-                "success": True,
-                "transcript": transcript.text,
-                "language": transcript.language,
-                "duration": getattr(transcript, 'duration', None),
-                "message": f"Транскрипция выполнена успешно ({transcript.language})"
-            }
+            # Join chunk texts in order and add up their durations (segments aren't kept)
+            text = " ".join(t["text"].strip() for t in transcripts if t.get("text"))
+            language = transcripts[0].get("language", "unknown")
+            total_duration = sum(float(t.get("duration") or 0) for t in transcripts)
+            # Plain json responses carry no duration, probe the file once instead
+            duration = total_duration or await self.probe_duration(audio_path)
+            
+            logger.info(f"✅ Transcription completed: {len(text)} characters")
+            
+            return TranscriptResult(
+                success=True,
+                transcript=text,
+                language=language,
+                duration=duration,
+                message=f"Транскрипция выполнена успешно ({language})"
+            )
             
         except Exception as e:
             logger.error(f"❌ Transcription error: {e}")
-            return {
-                "success": False,
-                "transcript": "",
-                "language": "en",
-                "message": f"Ошибка транскрипции: {str(e)}"
-            }
+            return TranscriptResult(
+                success=False,
+                transcript="",
+                language="en",
+                message=f"Ошибка транскрипции: {str(e)}"
+            )
+
+    def add_cost_estimate(self, transcription_result):
+        """Add the Whisper API cost estimate to a transcription result"""
+        # Local transcription is free
+        if self.backend == "openai" and transcription_result.duration:
+            cost = transcription_result.duration / 60 * 0.006  # $0.006 per minute
+            logger.info(f"💰 Estimated cost: ${cost:.4f}")
+            transcription_result.estimated_cost = cost
+        return transcription_result
 
-    def process_video(self, video_url, cleanup=True):
+    async def process_video(self, video_url, cleanup=True):
         """
         Full pipeline: extract audio + transcribe
         
@@ -187,53 +610,122 @@ class AudioProcessor:
             cleanup (bool): Remove temporary files
             
         Returns:
-            dict: Complete processing result
+            TranscriptResult: Complete processing result
         """
         audio_path = None
         try:
             logger.info(f"🚀 Starting video processing: {video_url}")
             
             # Step 1: Extract audio
-            audio_path = self.extract_audio_from_video(video_url)
+            audio_path = await self.extract_audio_from_video(video_url)
             
             # Step 2: Transcribe
-            transcription_result = self.transcribe_audio(audio_path)
+            transcription_result = await self.transcribe_audio(audio_path)
             
-            # Calculate cost estimate
-            if transcription_result.get("duration"):
-                cost = transcription_result["duration"] / 60 * 0.006  # $0.006 per minute
-                logger.info(f"💰 Estimated cost: ${cost:.4f}")
-                transcription_result["estimated_cost"] = cost
-            
-            return transcription_result
+            return self.add_cost_estimate(transcription_result)
             
         except Exception as e:
             logger.error(f"❌ Video processing error: {e}")
-            return {
-                "success": False,
-                "transcript": "",
-                "language": "en",
-                "message": f"Ошибка обработки видео: {str(e)}"
-            }
+            return TranscriptResult(
+                success=False,
+                transcript="",
+                language="en",
+                message=f"Ошибка обработки видео: {str(e)}"
+            )
         finally:
             # Cleanup temporary files
-            if cleanup and audio_path and os.path.exists(audio_path):
+            if cleanup and audio_path:
                 try:
                     os.unlink(audio_path)
                     logger.info(f"🗑️ Cleaned up: {audio_path}")
+                except FileNotFoundError:
+                    pass
                 except Exception as e:
                     logger.warning(f"⚠️ Cleanup warning: {e}")
 
-def main():
+    async def process_videos(self, video_urls, cleanup=True):
+        """
+        Run the full pipeline for several videos concurrently
+        
+        Args:
+            video_urls (list): URLs to videos
+            cleanup (bool): Remove temporary files
+            
+        Returns:
+            list: Processing results in the same order as video_urls
+        """
+        return await asyncio.gather(*[self.process_video(url, cleanup) for url in video_urls])
+
+    async def process_videos_batch(self, video_urls, cleanup=True):
+        """
+        Extract audio for all videos in parallel, then transcribe them
+        
+        With the local backend the model then works through the files back
+        to back instead of waiting on downloads in between.
+        
+        Args:
+            video_urls (list): URLs to videos
+            cleanup (bool): Remove temporary files
+            
+        Returns:
+            list: Processing results in the same order as video_urls
+        """
+        logger.info(f"🚀 Starting batch processing of {len(video_urls)} videos")
+        audio_paths = await asyncio.gather(
+            *[self.extract_audio_from_video(url) for url in video_urls],
+            return_exceptions=True
+        )
+        
+        async def transcribe(video_url, audio_path):
+            if isinstance(audio_path, Exception):
+                logger.error(f"❌ Video processing error for {video_url}: {audio_path}")
+                return TranscriptResult(
+                    success=False,
+                    transcript="",
+                    language="en",
+                    message=f"Ошибка обработки видео: {str(audio_path)}"
+                )
+            transcription_result = await self.transcribe_audio(audio_path)
+            return self.add_cost_estimate(transcription_result)
+        
+        try:
+            return await asyncio.gather(*[
+                transcribe(video_url, audio_path)
+                for video_url, audio_path in zip(video_urls, audio_paths)
+            ])
+        finally:
+            if cleanup:
+                self.remove_files([path for path in audio_paths if isinstance(path, str)])
+
+def print_json(result):
+    """Write result (TranscriptResult or a list of them) to stdout as indented UTF-8 JSON"""
+    if orjson is not None:
+        # orjson serializes dataclasses natively
+        sys.stdout.flush()
+        sys.stdout.buffer.write(orjson.dumps(result, option=orjson.OPT_INDENT_2) + b"\n")
+        sys.stdout.buffer.flush()
+    else:
+        print(json.dumps(result, ensure_ascii=False, indent=2, default=asdict))
+
+async def main():
     """Main function for command line usage"""
     if len(sys.argv) < 2:
-        print("Usage: python audio_processor.py <video_url>")
+        print("Usage: python audio_processor.py <video_url> [video_url ...]")
         sys.exit(1)
     
-    video_url = sys.argv[1]
+    video_urls = sys.argv[1:]
     processor = AudioProcessor()
-    result = processor.process_video(video_url)
-    print(json.dumps(result, ensure_ascii=False, indent=2))
+    
+    try:
+        if len(video_urls) == 1:
+            result = await processor.process_video(video_urls[0])
+        elif processor.backend == "local":
+            result = await processor.process_videos_batch(video_urls)
+        else:
+            result = await processor.process_videos(video_urls)
+    finally:
+        await processor.close()
+    print_json(result)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
@@ -9,39 +9,167 @@ import sys
 import json
 import asyncio
 import os
+import re
+import time
+from collections import OrderedDict
 from TikTokApi import TikTokApi
 import logging
 
+# orjson is optional, fall back to stdlib json when it isn't installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def search_tiktok_videos(query, max_results=5):
+# Trending videos are filtered by keyword, so fetch at most this many per wanted result
+TRENDING_FETCH_FACTOR = 4
+
+# Resolved hashtag handles are reused for repeated queries within this many seconds
+HASHTAG_CACHE_TTL = 300
+HASHTAG_CACHE_MAX_SIZE = 256
+
+def video_to_dict(video, default_title, video_dict=None):
     """
-    Search for TikTok videos using the free TikTok-Api library
+    Convert a TikTokApi video into our video record
     
     Args:
-        query (str): Search query
-        max_results (int): Maximum number of results to return
+        video: TikTokApi Video object
+        default_title (str): Title to use when the video has no description
+        video_dict (dict): Optional video.as_dict already read by the caller
         
     Returns:
-        dict: Search results with success status and videos list
+        dict: Video data
     """
-    try:
-        logger.info(f"🔍 Searching TikTok for: '{query}' (max {max_results} results)")
-        
+    # Read properties once per video, they may be rebuilt on every access
+    if video_dict is None:
+        video_dict = video.as_dict
+    video_id = video.id
+    username = video.author.username
+    
+    # Look up nested sections once per video
+    stats = video_dict.get('stats') or {}
+    video_info = video_dict.get('video') or {}
+    music = video_dict.get('music') or {}
+    desc = video_dict.get('desc', '') or ""
+    text_extra = video_dict.get('textExtra') or []
+    
+    return {
+        "video_id": video_id,
+        "platform": "tiktok",
+        "title": desc or default_title,
+        "description": desc,
+        "url": f"https://www.tiktok.com/@{username}/video/{video_id}",
+        "thumbnail_url": video_info.get('cover', '') or "",
+        "views": stats.get('playCount', 0) or 0,
+        "likes": stats.get('diggCount', 0) or 0,
+        "comments": stats.get('commentCount', 0) or 0,
+        "duration": video_info.get('duration', 30) or 30,
+        "published_at": str(video_dict.get('createTime', '')),
+        "author": username,
+        "hashtags": [name for tag in text_extra if (name := tag.get('hashtagName'))],
+        "music": music.get('title', '') or '',
+    }
+
+class TikTokSearcher:
+    """
+    TikTok search that keeps one TikTokApi session alive across queries
+    
+    Session bootstrap launches a Playwright browser, so reuse the same
+    searcher for repeated queries instead of creating a new one each time:
+    
+        async with TikTokSearcher() as searcher:
+            result = await searcher.search(query, max_results)
+    """
+    
+    def __init__(self, ms_token=None):
         # Get ms_token from environment (optional for trending)
-        ms_token = os.environ.get("ms_token", None)
+        self.ms_token = ms_token or os.environ.get("ms_token", None)
+        self.api = None
+        self._start_lock = asyncio.Lock()
+        # Event loop the session was started on, the browser only works there
+        self.loop = None
+        # name -> (created_at, Hashtag) oldest first, handles belong to the current session
+        self._hashtag_cache = OrderedDict()
+    
+    async def __aenter__(self):
+        # Session is started lazily by the first search so errors end up in its result
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+    
+    async def start(self):
+        """Start the TikTokApi browser session if it isn't running yet"""
+        async with self._start_lock:
+            if self.api is not None:
+                return
+            self.loop = asyncio.get_running_loop()
+            
+            api = TikTokApi()
+            await api.__aenter__()
+            try:
+                # Create sessions if we have ms_token
+                if self.ms_token:
+                    await api.create_sessions(ms_tokens=[self.ms_token], num_sessions=1, sleep_after=3)
+                    logger.info("✅ Created authenticated session")
+                else:
+                    logger.warning("⚠️ No ms_token found, trying without authentication")
+            except Exception:
+                await api.__aexit__(None, None, None)
+                raise
+            self.api = api
+    
+    async def close(self):
+        """Close the TikTokApi session and its browser"""
+        if self.api is not None:
+            api, self.api = self.api, None
+            self._hashtag_cache.clear()
+            await api.__aexit__(None, None, None)
+    
+    def get_hashtag(self, name):
+        """
+        Return a hashtag handle, reusing one created in the last HASHTAG_CACHE_TTL seconds
+        
+        The handle keeps the hashtag id it resolved, so repeated queries skip that lookup.
+        """
+        now = time.monotonic()
+        cached = self._hashtag_cache.get(name)
+        if cached and now - cached[0] < HASHTAG_CACHE_TTL:
+            return cached[1]
+        
+        hashtag = self.api.hashtag(name=name)
+        self._hashtag_cache.pop(name, None)
+        self._hashtag_cache[name] = (now, hashtag)
         
-        # Initialize TikTok API with context manager
-        async with TikTokApi() as api:
+        # Entries are ordered by creation time: drop expired ones, then the oldest over the cap
+        while self._hashtag_cache:
+            created_at, _ = next(iter(self._hashtag_cache.values()))
+            if now - created_at < HASHTAG_CACHE_TTL and len(self._hashtag_cache) <= HASHTAG_CACHE_MAX_SIZE:
+                break
+            self._hashtag_cache.popitem(last=False)
+        return hashtag
+    
+    async def search(self, query, max_results=5):
+        """
+        Search for TikTok videos using the free TikTok-Api library
+        
+        Args:
+            query (str): Search query
+            max_results (int): Maximum number of results to return
             
-            # Create sessions if we have ms_token
-            if ms_token:
-                await api.create_sessions(ms_tokens=[ms_token], num_sessions=1, sleep_after=3)
-                logger.info("✅ Created authenticated session")
-            else:
-                logger.warning("⚠️ No ms_token found, trying without authentication")
+        Returns:
+            dict: Search results with success status and videos list
+        """
+        try:
+            logger.info(f"🔍 Searching TikTok for: '{query}' (max {max_results} results)")
+            
+            # Reuse the running session, starting it on first search
+            await self.start()
+            api = self.api
             
             videos = []
             
@@ -50,39 +178,28 @@ async def search_tiktok_videos(query, max_results=5):
                 hashtag_query = query.replace(" ", "").lower()
                 logger.info(f"🏷️ Trying hashtag search: #{hashtag_query}")
                 
-                hashtag = api.hashtag(name=hashtag_query)
+                hashtag = self.get_hashtag(hashtag_query)
                 video_count = 0
-                async for video in hashtag.videos(count=max_results):
-                    if video_count >= max_results:
-                        break
-                    
-                    try:
-                        video_dict = video.as_dict
-                        
-                        # Extract video data
-                        video_data = {
-                            "video_id": video.id,
-                            "platform": "tiktok",
-                            "title": video_dict.get('desc', '') or f"TikTok video about {query}",
-                            "description": video_dict.get('desc', '') or "",
-                            "url": f"https://www.tiktok.com/@{video.author.username}/video/{video.id}",
-                            "thumbnail_url": video_dict.get('video', {}).get('cover', '') or "",
-                            "views": video_dict.get('stats', {}).get('playCount', 0) or 0,
-                            "likes": video_dict.get('stats', {}).get('diggCount', 0) or 0,
-                            "comments": video_dict.get('stats', {}).get('commentCount', 0) or 0,
-                            "duration": video_dict.get('video', {}).get('duration', 30) or 30,
-                            "published_at": str(video_dict.get('createTime', '')),
-                            "author": video.author.username,
-                            "hashtags": [tag.get('hashtagName', '') for tag in video_dict.get('textExtra', []) if tag.get('hashtagName')],
-                            "music": video_dict.get('music', {}).get('title', '') if video_dict.get('music') else '',
-                        }
-                        videos.append(video_data)
-                        video_count += 1
-                        logger.info(f"✅ Found: {video_data['title'][:50]}... ({video_data['views']} views)")
+                hashtag_videos = hashtag.videos(count=max_results)
+                try:
+                    async for video in hashtag_videos:
+                        try:
+                            # Extract video data
+                            video_data = video_to_dict(video, f"TikTok video about {query}")
+                            videos.append(video_data)
+                            video_count += 1
+                            logger.info(f"✅ Found: {video_data['title'][:50]}... ({video_data['views']} views)")
+                            
+                        except Exception as e:
+                            logger.warning(f"⚠️ Error processing video {video.id}: {e}")
+                            continue
                         
-                    except Exception as e:
-                        logger.warning(f"⚠️ Error processing video {video.id}: {e}")
-                        continue
+                        # Stop before the next page is requested
+                        if video_count >= max_results:
+                            break
+                finally:
+                    # Release the connection promptly on early break
+                    await hashtag_videos.aclose()
                         
             except Exception as hashtag_error:
                 logger.warning(f"⚠️ Hashtag search failed: {hashtag_error}")
@@ -90,70 +207,137 @@ async def search_tiktok_videos(query, max_results=5):
                 # Method 2: Fallback to trending videos (doesn't require auth)
                 logger.info("🔥 Falling back to trending videos...")
                 try:
+                    # Match all query keywords in a single pass over each description
+                    keywords = [keyword.lower() for keyword in query.split()]
+                    keyword_re = re.compile('|'.join(map(re.escape, keywords))) if keywords else None
+                    
+                    # Only matching videos count towards max_results, fetched caps pagination
                     video_count = 0
-                    async for video in api.trending.videos(count=max_results):
-                        if video_count >= max_results:
-                            break
-                        
-                        try:
-                            video_dict = video.as_dict
+                    fetched = 0
+                    max_fetched = max_results * TRENDING_FETCH_FACTOR
+                    trending_videos = api.trending.videos(count=max_fetched)
+                    try:
+                        async for video in trending_videos:
+                            fetched += 1
                             
-                            # Check if video is relevant to query (simple keyword match)
-                            desc = video_dict.get('desc', '').lower()
-                            if any(keyword.lower() in desc for keyword in query.split()):
-                                video_data = {
-                                    "video_id": video.id,
-                                    "platform": "tiktok",
-                                    "title": video_dict.get('desc', '') or f"Trending TikTok video",
-                                    "description": video_dict.get('desc', '') or "",
-                                    "url": f"https://www.tiktok.com/@{video.author.username}/video/{video.id}",
-                                    "thumbnail_url": video_dict.get('video', {}).get('cover', '') or "",
-                                    "views": video_dict.get('stats', {}).get('playCount', 0) or 0,
-                                    "likes": video_dict.get('stats', {}).get('diggCount', 0) or 0,
-                                    "comments": video_dict.get('stats', {}).get('commentCount', 0) or 0,
-                                    "duration": video_dict.get('video', {}).get('duration', 30) or 30,
-                                    "published_at": str(video_dict.get('createTime', '')),
-                                    "author": video.author.username,
-                                    "hashtags": [tag.get('hashtagName', '') for tag in video_dict.get('textExtra', []) if tag.get('hashtagName')],
-                                    "music": video_dict.get('music', {}).get('title', '') if video_dict.get('music') else '',
-                                }
-                                videos.append(video_data)
-                                logger.info(f"✅ Found trending: {video_data['title'][:50]}... ({video_data['views']} views)")
-                        
-                        except Exception as e:
-                            logger.warning(f"⚠️ Error processing trending video: {e}")
-                            continue
-                        
-                        video_count += 1
+                            try:
+                                video_dict = video.as_dict
+                                
+                                # Check if video is relevant to query (simple keyword match)
+                                desc = video_dict.get('desc', '').lower()
+                                if keyword_re is not None and keyword_re.search(desc):
+                                    video_data = video_to_dict(video, "Trending TikTok video", video_dict)
+                                    videos.append(video_data)
+                                    video_count += 1
+                                    logger.info(f"✅ Found trending: {video_data['title'][:50]}... ({video_data['views']} views)")
+                            
+                            except Exception as e:
+                                logger.warning(f"⚠️ Error processing trending video: {e}")
+                            
+                            if video_count >= max_results or fetched >= max_fetched:
+                                break
+                    finally:
+                        # Release the connection promptly on early break
+                        await trending_videos.aclose()
                         
                 except Exception as trending_error:
                     logger.error(f"❌ Trending search also failed: {trending_error}")
         
-        if videos:
-            logger.info(f"🎯 Successfully found {len(videos)} TikTok videos")
-            return {
-                "success": True,
-                "videos": videos,
-                "total_found": len(videos),
-                "message": f"Найдено {len(videos)} TikTok видео по запросу '{query}'"
-            }
-        else:
-            logger.warning(f"❌ No TikTok videos found for query: '{query}'")
+            if videos:
+                logger.info(f"🎯 Successfully found {len(videos)} TikTok videos")
+                return {
+                    "success": True,
+                    "videos": videos,
+                    "total_found": len(videos),
+                    "message": f"Найдено {len(videos)} TikTok видео по запросу '{query}'"
+                }
+            else:
+                logger.warning(f"❌ No TikTok videos found for query: '{query}'")
+                return {
+                    "success": False,
+                    "videos": [],
+                    "total_found": 0,
+                    "message": f"По запросу '{query}' TikTok видео не найдены. Попробуйте: 1) Добавить переменную ms_token из браузера, 2) Использовать более популярные ключевые слова."
+                }
+            
+        except Exception as e:
+            logger.error(f"❌ TikTok search error: {e}")
             return {
                 "success": False,
                 "videos": [],
                 "total_found": 0,
-                "message": f"По запросу '{query}' TikTok видео не найдены. Попробуйте: 1) Добавить переменную ms_token из браузера, 2) Использовать более популярные ключевые слова."
+                "message": f"Ошибка поиска TikTok: {str(e)}. Совет: получите ms_token из браузера для лучших результатов."
             }
-            
-    except Exception as e:
-        logger.error(f"❌ TikTok search error: {e}")
-        return {
-            "success": False,
-            "videos": [],
-            "total_found": 0,
-            "message": f"Ошибка поиска TikTok: {str(e)}. Совет: получите ms_token из браузера для лучших результатов."
-        }
+
+async def search_tiktok_videos(query, max_results=5):
+    """
+    Search for TikTok videos with a TikTokApi session opened and closed for this call
+    
+    Args:
+        query (str): Search query
+        max_results (int): Maximum number of results to return
+        
+    Returns:
+        dict: Search results with success status and videos list
+    """
+    async with TikTokSearcher() as searcher:
+        return await searcher.search(query, max_results)
+
+# Long-lived searcher for service deployments, see get_shared_searcher()
+_shared_searcher = None
+
+def get_shared_searcher():
+    """
+    Return the module-wide TikTokSearcher for services running many queries
+    
+    The browser session stays open between calls until close_shared_searcher()
+    is awaited, which the service must do on shutdown. The session is tied to
+    the event loop it started on, so all use must happen on that one loop.
+    
+    Raises:
+        RuntimeError: If the shared session was started on another event loop
+    """
+    global _shared_searcher
+    loop = asyncio.get_running_loop()
+    if _shared_searcher is not None and _shared_searcher.loop not in (None, loop):
+        raise RuntimeError(
+            "Shared TikTok searcher belongs to another event loop, "
+            "await close_shared_searcher() on that loop before it exits"
+        )
+    if _shared_searcher is None:
+        _shared_searcher = TikTokSearcher()
+    return _shared_searcher
+
+async def close_shared_searcher():
+    """Close the module-wide TikTokSearcher and its browser, if one was started"""
+    global _shared_searcher
+    searcher, _shared_searcher = _shared_searcher, None
+    if searcher is not None:
+        await searcher.close()
+
+async def search_tiktok_videos_shared(query, max_results=5):
+    """
+    Search for TikTok videos reusing the long-lived shared TikTokApi session
+    
+    Call close_shared_searcher() on shutdown to release the browser.
+    
+    Args:
+        query (str): Search query
+        max_results (int): Maximum number of results to return
+        
+    Returns:
+        dict: Search results with success status and videos list
+    """
+    return await get_shared_searcher().search(query, max_results)
+
+def print_json(result):
+    """Write result to stdout as indented UTF-8 JSON"""
+    if orjson is not None:
+        sys.stdout.flush()
+        sys.stdout.buffer.write(orjson.dumps(result, option=orjson.OPT_INDENT_2) + b"\n")
+        sys.stdout.buffer.flush()
+    else:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
 
 async def main():
     """Main function for command line usage"""
@@ -167,7 +351,7 @@ async def main():
     max_results = int(sys.argv[2]) if len(sys.argv) > 2 else 5
     
     result = await search_tiktok_videos(query, max_results)
-    print(json.dumps(result, ensure_ascii=False, indent=2))
+    print_json(result)
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file